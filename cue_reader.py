@@ -1,7 +1,6 @@
+import heapq
 import io
-import itertools
 import json
-import operator
 import re
 import sys
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
@@ -12,16 +11,20 @@ from functools import partial
 import attr
 
 from logicpro_timing.elm_output.elm_output import write_elm_output
-from logicpro_timing.parsing.helpers import groupwhile, no_break, text_with_break_type
+from logicpro_timing.parsing.helpers import (
+    break_charset, groupwhile, no_break, text_with_break_type
+)
 
 
 # This seems to be constant in Logic Pro
 TICKS_PER_BEAT = 960
 
-BREAK_TYPE_MAPPING = {
-    'Syllable': '•',
-    'Line': '¬',
-    'Page': '¶',
+_SECTION_RE = re.compile(r'\[([^\]]*)\]')
+
+_SECTION_ORDER = {
+    'tempo': 1,
+    'signatures': 2,
+    'events': 3
 }
 
 
@@ -34,60 +37,50 @@ def set_up_parser():
     return parser
 
 
-@attr.s
-class TaggedLine(object):
-    line = attr.ib()
-    tag = attr.ib()
-
-
 def strip_int_trailing_period(s):
-    try:
-        return int(s.rstrip('.')) - 1
-    except AttributeError:
-        return int(s) - 1
-
-
-def int_to_zero_index(s):
-    return int(s) - 1
+    return int(s[:-1] if s.endswith('.') else s) - 1
 
 
 def seconds_per_beat(tempo):
-    return Decimal(60) / Decimal(tempo)
+    return 60.0 / float(tempo)
 
 
-@attr.s
+@attr.s(slots=True, init=False)
 class Position(object):
-    measure = attr.ib(convert=int_to_zero_index)
-    beat = attr.ib(convert=int_to_zero_index)
-    division = attr.ib(convert=int_to_zero_index)
-    tick = attr.ib(convert=strip_int_trailing_period)
+    measure = attr.ib()
+    beat = attr.ib()
+    division = attr.ib()
+    tick = attr.ib()
+
+    def __init__(self, measure, beat, division, tick):
+        self.measure = int(measure) - 1
+        self.beat = int(beat) - 1
+        self.division = int(division) - 1
+        self.tick = strip_int_trailing_period(tick)
 
     def to_timedelta(self, tempo, time_signature):
-        return timedelta(
-            microseconds=int(
-                seconds_per_beat(tempo)
-                * 1000000
-                * (
-                    (self.measure * time_signature.beats)
-                    + (self.beat)
-                    + (self.division * Decimal(1) / Decimal(time_signature.division))
-                    + (self.tick * Decimal(1) / Decimal(TICKS_PER_BEAT))
-                )
-            )
+        beats_per_measure = float(time_signature.beats)
+        divisions_per_beat = float(time_signature.division)
+        total = seconds_per_beat(tempo) * (
+            (self.measure * beats_per_measure)
+            + self.beat
+            + (self.division / divisions_per_beat)
+            + (self.tick / TICKS_PER_BEAT)
         )
+        return timedelta(microseconds=int(total * 1000000))
 
 
-@attr.s
+@attr.s(slots=True)
 class Event(object):
-    position = attr.ib(validator=attr.validators.instance_of(Position))
+    position = attr.ib()
 
 
-@attr.s
+@attr.s(slots=True)
 class EventLength(object):
-    measures = attr.ib(convert=int)
-    beats = attr.ib(convert=int)
-    divisions = attr.ib(convert=int)
-    ticks = attr.ib(convert=strip_int_trailing_period)
+    measures = attr.ib(converter=int)
+    beats = attr.ib(converter=int)
+    divisions = attr.ib(converter=int)
+    ticks = attr.ib(converter=strip_int_trailing_period)
 
 
 def to_timedelta(time_str):
@@ -101,135 +94,129 @@ def to_timedelta(time_str):
     )
 
 
-@attr.s
+@attr.s(slots=True)
 class TempoEvent(Event):
-    tempo = attr.ib(convert=Decimal)
-    time = attr.ib(convert=to_timedelta)
+    tempo = attr.ib(converter=float)
+    time = attr.ib(converter=to_timedelta)
 
     @classmethod
     def from_string(cls, s):
-        measure, beat, division, tick, rest = s.split(maxsplit=4)
-        tempo, time = rest.split()
+        measure, beat, division, tick, tempo, time = s.split()
         return cls(Position(measure, beat, division, tick), tempo, time)
 
 
-@attr.s
+@attr.s(slots=True)
 class TimeSignature(object):
-    beats = attr.ib(convert=int)
-    division = attr.ib(convert=int)
+    beats = attr.ib(converter=int)
+    division = attr.ib(converter=int)
 
 
-@attr.s
+@attr.s(slots=True)
 class TimeSignatureEvent(Event):
-    time_signature = attr.ib(validator=attr.validators.instance_of(TimeSignature))
+    time_signature = attr.ib()
 
     @classmethod
     def from_string(cls, s):
-        measure, beat, division, tick, rest = s.split(maxsplit=4)
-        _, beats, _, divisions = rest.split()
+        """
+        Parse a time signature line, or return None for other signature events
+        """
+        tokens = s.split()
+        if tokens[4] != 'Time':
+            return None
+        measure, beat, division, tick, _, beats, _, divisions = tokens
         return cls(Position(measure, beat, division, tick),
                    TimeSignature(beats, divisions))
 
-    @classmethod
-    def validate(cls, data):
-        return data.split()[4] == 'Time'
-
 
-@attr.s
+@attr.s(slots=True)
 class NoteEvent(Event):
     title = attr.ib()
-    track = attr.ib(convert=int)
-    length = attr.ib(validator=attr.validators.instance_of(EventLength))
+    track = attr.ib(converter=int)
+    length = attr.ib()
 
     @classmethod
     def from_string(cls, s):
-        measure, beat, division, tick, rest = s.split(maxsplit=4)
+        (measure, beat, division, tick, title, track,
+         measures, beats, divisions, ticks) = s.split()
         pos = Position(measure, beat, division, tick)
-        title, track, rest = rest.split(maxsplit=2)
-        measures, beats, divisions, ticks = rest.split(maxsplit=4)
         length = EventLength(measures, beats, divisions, ticks)
         return cls(pos, title, track, length)
 
 
-def sections(stream):
+def parse_cue(stream):
     """
-    Tag each line of the stream with its [section] (or None)
+    Parse each line of the stream according to its [section]
     """
-    section_pattern = re.compile(r'\[(.*)\]')
+    match = _SECTION_RE.match
+    tempos = []
+    signatures = []
+    events = []
     section = None
     for line in stream:
-        matcher = section_pattern.match(line)
+        matcher = match(line)
         if matcher:
             section = matcher.group(1)
             continue
         line = line.strip()
-        if line:
-            yield TaggedLine(line, section)
-
-
-def splitter(stream):
-    """
-    Group each stream into sections
-    """
-    return itertools.groupby(sections(stream), operator.attrgetter('tag'))
-
-
-def parsed_sections(stream):
-    for section, lines in splitter(stream):
-        yield section, lines
+        if not line:
+            continue
+        if section == 'events':
+            events.append(NoteEvent.from_string(line))
+        elif section == 'tempo':
+            tempos.append(TempoEvent.from_string(line))
+        elif section == 'signatures':
+            signature = TimeSignatureEvent.from_string(line)
+            if signature is not None:
+                signatures.append(signature)
+        else:
+            raise RuntimeError('Unknown section {}'.format(section))
+    return tempos, signatures, events
 
 
 def section_order(args):
     section, _ = args
-    return {
-        'tempo': 1,
-        'signatures': 2,
-        'events': 3
-    }[section]
-
+    return _SECTION_ORDER[section]
 
-def get_tempos(data):
-    return [TempoEvent.from_string(row.line) for row in data]
 
-
-def get_signatures(data):
-    return [TimeSignatureEvent.from_string(row.line) for row in data
-            if TimeSignatureEvent.validate(row.line)]
-
-
-def get_events(data):
-    return [NoteEvent.from_string(row.line) for row in data]
+def position_key(event):
+    position = event.position
+    return (position.measure, position.beat, position.division, position.tick)
 
 
 class EventStream(object):
     def __init__(self, tempos, signatures, events, default_tempo=120):
-        self._stream = sorted(
-            itertools.chain(tempos, signatures, events),
-            key=operator.attrgetter('position')
+        # Each section of a cue file is already in position order
+        self._stream = list(
+            heapq.merge(tempos, signatures, events, key=position_key)
         )
         self._curr_time = timedelta()
-        self._curr_position = Position(1, 1, 1, 1)
-        self._curr_tempo = Decimal(default_tempo)
+        self._curr_position = Position('1', '1', '1', '1')
+        self._curr_tempo = float(default_tempo)
         self._curr_signature = TimeSignature(4, 4)
+        self._curr_position_td = self._position_offset(self._curr_position)
         self._last_tempo_change = timedelta()
 
+    def _position_offset(self, position):
+        return position.to_timedelta(self._curr_tempo, self._curr_signature)
+
     def _compute_time(self, event):
-        event_pos = event.position
-        return (
-            self._curr_time
-            + event_pos.to_timedelta(self._curr_tempo, self._curr_signature)
-            - self._curr_position.to_timedelta(self._curr_tempo, self._curr_signature)
-        )
+        event_td = self._position_offset(event.position)
+        new_time = self._curr_time + event_td - self._curr_position_td
+        self._curr_position_td = event_td
+        return new_time
 
     def event_times(self):
         for item in self._stream:
             new_time = self._compute_time(item)
-            if hasattr(item, 'tempo'):
+            item_type = type(item)
+            if item_type is TempoEvent:
                 self._curr_tempo = item.tempo
                 self._last_tempo_change = item.time
-            elif hasattr(item, 'time_signature'):
+                self._curr_position_td = self._position_offset(item.position)
+            elif item_type is TimeSignatureEvent:
                 self._curr_signature = item.time_signature
-            elif hasattr(item, 'length'):
+                self._curr_position_td = self._position_offset(item.position)
+            elif item_type is NoteEvent:
                 yield (new_time, item)
             self._curr_time = new_time
             self._curr_position = item.position
@@ -241,42 +228,39 @@ def timedelta_handler(obj):
 
 
 def dump_nested_json(event_list, json_file):
+    page_continues = partial(no_break, break_charset(['Page']))
+    line_continues = partial(no_break, break_charset(['Line']))
     json.dump(
         ([
             ([
                 ([
                     {
                         "text": text_with_break_type(token['text']),
-                        "time": token['time'].total_seconds()
+                        "time": token['time_s']
                     }
                     for token in line
                 ])
-                for line in groupwhile(partial(no_break, ['Line']), page)
+                for line in groupwhile(line_continues, page)
             ])
-            for page in groupwhile(partial(no_break, ['Page']), event_list)
+            for page in groupwhile(page_continues, event_list)
         ]),
         json_file,
-        indent=4,
+        separators=(',', ':'),
+        ensure_ascii=False,
     )
 
 
 def main():
     args = set_up_parser().parse_args()
-    with open(args.cue_file) as stream:
-        for section, data in parsed_sections(stream):
-            if section == 'tempo':
-                tempos = get_tempos(data)
-            elif section == 'signatures':
-                signatures = get_signatures(data)
-            elif section == 'events':
-                events = get_events(data)
-            else:
-                raise RuntimeError('Unknown section {}'.format(section))
+    with io.open(args.cue_file, 'r', encoding='utf-8') as cue_file:
+        lines = cue_file.read().splitlines()
+    tempos, signatures, events = parse_cue(lines)
     event_stream = EventStream(tempos, signatures, events)
-    output_list = [{'text': event.title, 'time': time}
+    output_list = [{'text': event.title, 'time_s': time.total_seconds()}
                    for time, event in event_stream.event_times()]
     if args.json:
-        with io.open(args.json, 'w', encoding='utf-8') as json_file:
+        with io.open(args.json, 'w', encoding='utf-8',
+                     buffering=1 << 20) as json_file:
             dump_nested_json(output_list, json_file)
     if args.elm:
         write_elm_output(args.elm, output_list)
@@ -1,7 +1,7 @@
 from functools import partial
 import io
 
-from ..parsing.helpers import text_with_break_type, no_break, groupwhile
+from ..parsing.helpers import text_with_break_type, no_break, groupwhile, break_charset
 
 
 ELM_FILE_HEADER = """
@@ -44,28 +44,29 @@ lyrics =
 
 
 def print_lyrics_tree(event_list, out_file):
-    lyric_template = '          Lyric "{text}" <| {time} * Time.second'
-    print(
-        '    [\n' +
-        ',\n'.join([
-            '      [\n' +
-            ',\n'.join([
-                '        [\n' +
-                ',\n'.join([
-                    lyric_template.format(
-                        text=text_with_break_type(token['text']),
-                        time=token['time'].total_seconds()
-                    )
-                    for token in line]) +
-                '\n        ]'
-                for line in groupwhile(partial(no_break, ['Line']), page)
-            ]) +
-            ' ]'
-            for page in groupwhile(partial(no_break, ['Page']), event_list)
-        ])
-        + ' ]'
-        , file=out_file
-    )
+    lyric_template = '          Lyric "%s" <| %s * Time.second'
+    write = out_file.write
+    page_continues = partial(no_break, break_charset(['Page']))
+    line_continues = partial(no_break, break_charset(['Line']))
+    write('    [\n')
+    for page_index, page in enumerate(groupwhile(page_continues, event_list)):
+        if page_index:
+            write(',\n')
+        write('      [\n')
+        for line_index, line in enumerate(groupwhile(line_continues, page)):
+            if line_index:
+                write(',\n')
+            write('        [\n')
+            for token_index, token in enumerate(line):
+                if token_index:
+                    write(',\n')
+                write(lyric_template % (
+                    text_with_break_type(token['text']),
+                    token['time_s']
+                ))
+            write('\n        ]')
+        write(' ]')
+    write(' ]\n')
 
 
 def write_elm_output(elm_filename, event_list):
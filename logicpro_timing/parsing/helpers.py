@@ -1,35 +1,35 @@
-from collections import deque
-
-
 BREAK_TYPE_MAPPING = {
     'Syllable': '•',
     'Line': '¬',
     'Page': '¶',
 }
 
+_BREAK_CHARSET = frozenset(BREAK_TYPE_MAPPING.values())
+
 
 def text_with_break_type(text):
-    if text and text[-1] in BREAK_TYPE_MAPPING.values():
-        return text[:-1]
-    elif text and text.endswith(BREAK_TYPE_MAPPING['Syllable']):
+    if text[-1:] in _BREAK_CHARSET:
         return text[:-1]
     return text + ' '
 
 
-def no_break(break_types, lyric):
-    return not has_break(break_types, lyric)
+def break_charset(break_types):
+    return frozenset(BREAK_TYPE_MAPPING[break_type] for break_type in break_types)
+
+
+def no_break(break_chars, lyric):
+    return not has_break(break_chars, lyric)
 
 
-def has_break(break_types, lyric):
-    return any (lyric['text'].endswith(BREAK_TYPE_MAPPING[break_type])
-                for break_type in break_types)
+def has_break(break_chars, lyric):
+    return lyric['text'][-1:] in break_chars
 
 
 def groupwhile(predicate, iterable):
-    inner = deque()
+    inner = []
     for i in iterable:
         inner.append(i)
         if not predicate(i):
             yield inner
-            inner.clear()
+            inner = []
     yield inner